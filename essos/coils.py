@@ -1,13 +1,50 @@
 import jax
 jax.config.update("jax_enable_x64", True)
 import jax.numpy as jnp
-from jax.lax import fori_loop
 from jax import tree_util, jit, vmap
-from functools import partial
+from functools import partial, lru_cache
+import numpy as np
 from .plot import fix_matplotlib_3d
 
 def compute_curvature(gammadash, gammadashdash):
-    return jnp.linalg.norm(jnp.cross(gammadash, gammadashdash, axis=1), axis=1) / jnp.linalg.norm(gammadash, axis=1)**3
+    cross = jnp.cross(gammadash, gammadashdash, axis=1)
+    numerator_squared = jnp.sum(cross*cross, axis=1)
+    denominator_squared = jnp.sum(gammadash*gammadash, axis=1)
+    return jnp.sqrt(numerator_squared / denominator_squared**3)
+
+@lru_cache(maxsize=16)
+def _fourier_basis(n_segments, order):
+    # basis[2*(n-1)+j, k, d] is the d-th derivative of sin (j=0) or cos (j=1) of order n at quadpoint k.
+    # Built with numpy so that the cached arrays are plain constants, also when first requested inside a jit trace.
+    quadpoints = np.linspace(0, 1, n_segments, endpoint=False)
+    order_indices = np.arange(1, order+1)
+    angles = 2 * np.pi * np.outer(order_indices, quadpoints)
+    S = np.sin(angles)
+    C = np.cos(angles)
+    dS =  2 * np.pi * order_indices[:, None] * C
+    dC = -2 * np.pi * order_indices[:, None] * S
+    ddS = -(2 * np.pi * order_indices[:, None])**2 * S
+    ddC = -(2 * np.pi * order_indices[:, None])**2 * C
+    basis = np.reshape(np.stack([np.stack([S, dS, ddS], axis=-1), np.stack([C, dC, ddC], axis=-1)], axis=1), (2*order, n_segments, 3))
+    basis.flags.writeable = False
+    return basis
+
+@partial(jit, static_argnums=(1, 2, 3))
+def _compute_curves_geometry(curves, order, n_segments, dtype=None):
+    # dtype optionally lowers the precision of the Fourier contraction; the outputs keep the dtype of curves
+    basis = jnp.asarray(_fourier_basis(n_segments, order), dtype=dtype or curves.dtype)
+    derivatives = jnp.einsum("cdo,okn->nckd", curves[:, :, 1:].astype(basis.dtype), basis, optimize="optimal").astype(curves.dtype)
+    gamma          = curves[:, None, :, 0] + derivatives[0]
+    gamma_dash     = derivatives[1]
+    gamma_dashdash = derivatives[2]
+    length = jnp.mean(jnp.linalg.norm(gamma_dash, axis=2), axis=1)
+    curvature = vmap(compute_curvature)(gamma_dash, gamma_dashdash)
+    return gamma, gamma_dash, gamma_dashdash, length, curvature
+
+@partial(jit, static_argnames=['nfp', 'stellsym', 'n_segments', 'dtype'])
+def _compute_gamma(dofs, nfp, stellsym, n_segments, dtype=None):
+    curves = apply_symmetries_to_curves(dofs, nfp, stellsym)
+    return (curves,) + _compute_curves_geometry(curves, dofs.shape[2]//2, n_segments, dtype)
 
 class Curves:
     """
@@ -23,9 +60,10 @@ class Curves:
         curves jnp.ndarray - shape (n_indcurves*nfp*(1+stellsym), 3, 2*order+1)): Curves obtained by applying rotations and flipping corresponding to nfp fold rotational symmetry and optionally stellarator symmetry
         gamma (jnp.array - shape (n_coils, n_segments, 3)): Discretized curves
         gamma_dash (jnp.array - shape (n_coils, n_segments, 3)): Discretized curves derivatives
+        dtype (jnp.dtype): Precision of the Fourier basis evaluation, e.g. jnp.float32 to halve its memory traffic. The discretized curves keep the dtype of dofs
 
     """
-    def __init__(self, dofs: jnp.ndarray, n_segments: int = 100, nfp: int = 1, stellsym: bool = True):
+    def __init__(self, dofs: jnp.ndarray, n_segments: int = 100, nfp: int = 1, stellsym: bool = True, dtype=jnp.float64):
         dofs = jnp.array(dofs)
         # assert isinstance(dofs, jnp.ndarray), "dofs must be a jnp.ndarray"
         assert dofs.ndim == 3, "dofs must be a 3D array with shape (n_curves, 3, 2*order+1)"
@@ -41,10 +79,10 @@ class Curves:
         self._n_segments = n_segments
         self._nfp = nfp
         self._stellsym = stellsym
+        self._dtype = dtype
         self._order = dofs.shape[2]//2
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
         self.quadpoints = jnp.linspace(0, 1, self.n_segments, endpoint=False)
-        self._set_gamma()
+        self._rebuild()
 
     def __str__(self):
         return f"nfp stellsym order\n{self.nfp} {self.stellsym} {self.order}\n"\
@@ -56,30 +94,18 @@ class Curves:
 
     def _tree_flatten(self):
         children = (self._dofs,)  # arrays / dynamic values
-        aux_data = {"n_segments": self._n_segments, "nfp": self._nfp, "stellsym": self._stellsym}  # static values
+        aux_data = {"n_segments": self._n_segments, "nfp": self._nfp, "stellsym": self._stellsym, "dtype": self._dtype}  # static values
         return (children, aux_data)
 
     @classmethod
     def _tree_unflatten(cls, aux_data, children):
         return cls(*children, **aux_data)
     
-    partial(jit, static_argnames=['self'])
-    def _set_gamma(self):
-        def fori_createdata(order_index: int, data: jnp.ndarray) -> jnp.ndarray:
-            return data[0] + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index - 1],                             jnp.sin(2 * jnp.pi * order_index * self.quadpoints)) + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index],                             jnp.cos(2 * jnp.pi * order_index * self.quadpoints)), \
-                   data[1] + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index - 1],  2*jnp.pi   *order_index   *jnp.cos(2 * jnp.pi * order_index * self.quadpoints)) + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index], -2*jnp.pi   *order_index   *jnp.sin(2 * jnp.pi * order_index * self.quadpoints)), \
-                   data[2] + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index - 1], -4*jnp.pi**2*order_index**2*jnp.sin(2 * jnp.pi * order_index * self.quadpoints)) + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index], -4*jnp.pi**2*order_index**2*jnp.cos(2 * jnp.pi * order_index * self.quadpoints))
-        gamma          = jnp.einsum("ij,k->ikj", self._curves[:, :, 0], jnp.ones(self.n_segments))
-        gamma_dash     = jnp.zeros((jnp.size(self._curves, 0), self.n_segments, 3))
-        gamma_dashdash = jnp.zeros((jnp.size(self._curves, 0), self.n_segments, 3))
-        gamma, gamma_dash, gamma_dashdash = fori_loop(1, self._order+1, fori_createdata, (gamma, gamma_dash, gamma_dashdash)) 
-        length = jnp.array([jnp.mean(jnp.linalg.norm(d1gamma, axis=1)) for d1gamma in gamma_dash])
-        curvature = vmap(compute_curvature)(gamma_dash, gamma_dashdash)
-        self._gamma = gamma
-        self._gamma_dash = gamma_dash
-        self._gamma_dashdash = gamma_dashdash
-        self._curvature = curvature
-        self._length = length
+    def _rebuild(self):
+        (self._curves, self._gamma, self._gamma_dash, self._gamma_dashdash,
+            self._length, self._curvature) = _compute_gamma(self.dofs, self.nfp, self.stellsym, self.n_segments, self.dtype)
+        # Results staged into an enclosing jit trace from concrete dofs are not kept, so tracers cannot outlive it
+        self._dirty = isinstance(self._gamma, jax.core.Tracer) and not isinstance(self._dofs, jax.core.Tracer)
     
     @property
     def dofs(self):
@@ -93,11 +119,12 @@ class Curves:
         assert jnp.size(new_dofs, 2) % 2 == 1
         self._dofs = new_dofs
         self._order = jnp.size(new_dofs, 2)//2
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def curves(self):
+        if self._dirty:
+            self._rebuild()
         return self._curves
     
     @property 
@@ -110,8 +137,7 @@ class Curves:
         assert new_order > 0
         self._dofs = jnp.pad(self.dofs, ((0, 0), (0, 0), (0, 2*(new_order-self._order)))) if new_order > self._order else self.dofs[:, :, :2*(new_order)+1]
         self._order = new_order
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
 
     @property
     def n_segments(self):
@@ -123,7 +149,7 @@ class Curves:
         assert new_n_segments > 2
         self._n_segments = new_n_segments
         self.quadpoints = jnp.linspace(0, 1, self._n_segments, endpoint=False)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def nfp(self):
@@ -134,8 +160,7 @@ class Curves:
         assert isinstance(new_nfp, int)
         assert new_nfp > 0
         self._nfp = new_nfp
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def stellsym(self):
@@ -145,27 +170,40 @@ class Curves:
     def stellsym(self, new_stellsym):
         assert isinstance(new_stellsym, bool)
         self._stellsym = new_stellsym
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
+    
+    @property
+    def dtype(self):
+        return self._dtype
     
     @property
     def gamma(self):
+        if self._dirty:
+            self._rebuild()
         return self._gamma
     
     @property
     def gamma_dash(self):
+        if self._dirty:
+            self._rebuild()
         return self._gamma_dash
     
     @property
     def gamma_dashdash(self):
+        if self._dirty:
+            self._rebuild()
         return self._gamma_dashdash
     
     @property
     def length(self):
+        if self._dirty:
+            self._rebuild()
         return self._length
     
     @property
     def curvature(self):
+        if self._dirty:
+            self._rebuild()
         return self._curvature
     
     def __len__(self):
@@ -173,15 +211,15 @@ class Curves:
     
     def __getitem__(self, key):
         if isinstance(key, int):
-            return Curves(jnp.expand_dims(self.curves[key], 0), self.n_segments, 1, False)
+            return Curves(jnp.expand_dims(self.curves[key], 0), self.n_segments, 1, False, self.dtype)
         elif isinstance(key, (slice, jnp.ndarray)):
-            return Curves(self.curves[key], self.n_segments, 1, False)
+            return Curves(self.curves[key], self.n_segments, 1, False, self.dtype)
         else:
             raise TypeError(f"Invalid argument type. Got {type(key)}, expected int, slice or jnp.ndarray.")
         
     def __add__(self, other):
         if isinstance(other, Curves):
-            return Curves(jnp.concatenate((self.curves, other.curves), axis=0), self.n_segments, 1, False)
+            return Curves(jnp.concatenate((self.curves, other.curves), axis=0), self.n_segments, 1, False, self.dtype)
         else:
             raise TypeError(f"Invalid argument type. Got {type(other)}, expected Curves.")
         
@@ -297,9 +335,9 @@ class Curves_from_simsopt(Curves):
             simsopt_coils = bs.coils
             simsopt_curves = [c.curve for c in simsopt_coils]
         simsopt_curves = simsopt_curves[0:int(len(simsopt_curves)/nfp/(1+stellsym))]
-        dofs = jnp.reshape(jnp.array(
-            [curve.x for curve in simsopt_curves]
-        ), (len(simsopt_curves), 3, 2*simsopt_curves[0].order+1))
+        dofs = jnp.asarray(np.reshape(np.stack(
+            [np.asarray(curve.x) for curve in simsopt_curves]
+        ), (len(simsopt_curves), 3, 2*simsopt_curves[0].order+1)))
         n_segments = len(simsopt_curves[0].quadpoints)
         super().__init__(dofs, n_segments, nfp, stellsym)
 
@@ -312,7 +350,7 @@ class Coils(Curves):
         assert isinstance(curves, Curves)
         currents = jnp.array(currents)
         assert jnp.size(currents) == jnp.size(curves.dofs, 0)
-        super().__init__(curves.dofs, curves.n_segments, curves.nfp, curves.stellsym)
+        super().__init__(curves.dofs, curves.n_segments, curves.nfp, curves.stellsym, curves.dtype)
         self._currents_scale = jnp.mean(jnp.abs(currents))
         self._dofs_currents = currents/self._currents_scale
         self._currents = apply_symmetries_to_currents(self._dofs_currents*self._currents_scale, self.nfp, self.stellsym)
@@ -376,15 +414,15 @@ class Coils(Curves):
 
     def __getitem__(self, key):
         if isinstance(key, int):
-            return Coils(Curves(jnp.expand_dims(self.curves[key], 0), self.n_segments, 1, False), jnp.expand_dims(self.currents[key], 0))
+            return Coils(Curves(jnp.expand_dims(self.curves[key], 0), self.n_segments, 1, False, self.dtype), jnp.expand_dims(self.currents[key], 0))
         elif isinstance(key, (slice, jnp.ndarray)):
-            return Coils(Curves(self.curves[key], self.n_segments, 1, False), self.curves[key])
+            return Coils(Curves(self.curves[key], self.n_segments, 1, False, self.dtype), self.curves[key])
         else:
             raise TypeError(f"Invalid argument type. Got {type(key)}, expected int, slice or jnp.ndarray.")
     
     def __add__(self, other):
         if isinstance(other, Coils):
-            return Coils(Curves(jnp.concatenate((self.curves, other.curves), axis=0), self.n_segments, 1, False), jnp.concatenate((self.currents, other.currents), axis=0))
+            return Coils(Curves(jnp.concatenate((self.curves, other.curves), axis=0), self.n_segments, 1, False, self.dtype), jnp.concatenate((self.currents, other.currents), axis=0))
         else:
             raise TypeError(f"Invalid argument type. Got {type(other)}, expected Coils.")
         
@@ -407,7 +445,7 @@ class Coils(Curves):
 
     
     def _tree_flatten(self):
-        children = (Curves(self.dofs, self.n_segments, self.nfp, self.stellsym), self._dofs_currents)  # arrays / dynamic values
+        children = (Curves(self.dofs, self.n_segments, self.nfp, self.stellsym, self.dtype), self._dofs_currents)  # arrays / dynamic values
         aux_data = {}  # static values
         return (children, aux_data)
 
@@ -477,16 +515,17 @@ tree_util.register_pytree_node(Coils,
 def CreateEquallySpacedCurves(n_curves: int, order: int, R: float, r: float, n_segments: int = 100,
                               nfp: int = 1, stellsym: bool = False) -> jnp.ndarray:
     angles = (jnp.arange(n_curves) + 0.5) * (2 * jnp.pi) / ((1 + int(stellsym)) * nfp * n_curves)
-    curves = jnp.zeros((n_curves, 3, 1 + 2 * order))
+    cos_angles = jnp.cos(angles)
+    sin_angles = jnp.sin(angles)
+    zeros = jnp.zeros_like(angles)
 
-    curves = curves.at[:, 0, 0].set(jnp.cos(angles) * R)  # x[0]
-    curves = curves.at[:, 0, 2].set(jnp.cos(angles) * r)  # x[2]
-    curves = curves.at[:, 1, 0].set(jnp.sin(angles) * R)  # y[0]
-    curves = curves.at[:, 1, 2].set(jnp.sin(angles) * r)  # y[2]
-    curves = curves.at[:, 2, 1].set(-r)                   # z[1] (constant for all)
+    x = jnp.stack([cos_angles * R, zeros, cos_angles * r], axis=-1)  # x[0], x[2]
+    y = jnp.stack([sin_angles * R, zeros, sin_angles * r], axis=-1)  # y[0], y[2]
+    z = jnp.stack([zeros, -r * jnp.ones_like(angles), zeros], axis=-1)  # z[1] (constant for all)
+    curves = jnp.pad(jnp.stack([x, y, z], axis=1), ((0, 0), (0, 0), (0, 2 * order - 2)))
     return Curves(curves, n_segments=n_segments, nfp=nfp, stellsym=stellsym)
 
-def RotatedCurve(curve, phi, flip):
+def RotationMatrix(phi, flip):
     rotmat = jnp.array(
         [[jnp.cos(phi), -jnp.sin(phi), 0],
          [jnp.sin(phi),  jnp.cos(phi), 0],
@@ -496,29 +535,29 @@ def RotatedCurve(curve, phi, flip):
             [[1,  0,  0],
              [0, -1,  0],
              [0,  0, -1]])
-    return curve @ rotmat
+    return rotmat
+
+def RotatedCurve(curve, phi, flip):
+    return curve @ RotationMatrix(phi, flip)
 
 @partial(jit, static_argnames=['nfp', 'stellsym'])
 def apply_symmetries_to_curves(base_curves, nfp, stellsym):
-    flip_list = [False, True] if stellsym else [False]
-    curves = []
-    for k in range(0, nfp):
-        for flip in flip_list:
-            for i in range(len(base_curves)):
-                if k == 0 and not flip:
-                    curves.append(base_curves[i])
-                else:
-                    rotcurve = RotatedCurve(base_curves[i].T, 2*jnp.pi*k/nfp, flip)
-                    curves.append(rotcurve.T)
-    return jnp.array(curves)
+    angles = jnp.arange(nfp) * (2*jnp.pi/nfp)
+    cos_angles = jnp.cos(angles)
+    sin_angles = jnp.sin(angles)
+    zeros = jnp.zeros_like(angles)
+    ones = jnp.ones_like(angles)
+    # Same matrices as RotationMatrix(angle, False) for every angle, stacked along the first axis
+    rotmats = jnp.stack([jnp.stack([ cos_angles, sin_angles, zeros], axis=-1),
+                         jnp.stack([-sin_angles, cos_angles, zeros], axis=-1),
+                         jnp.stack([ zeros,      zeros,      ones], axis=-1)], axis=1)
+    if stellsym:
+        rotmats = jnp.reshape(jnp.stack([rotmats, rotmats * jnp.array([1, -1, -1])], axis=1), (-1, 3, 3))
+    curves = jnp.einsum("aic,sij->sajc", base_curves, rotmats, optimize="optimal")
+    return jnp.reshape(curves, (-1, 3, base_curves.shape[2]))
 
 @partial(jit, static_argnames=['nfp', 'stellsym'])
-def apply_symmetries_to_currents(base_currents, nfp, stellsym): 
-    flip_list = [False, True] if stellsym else [False]
-    currents = []
-    for k in range(0, nfp):
-        for flip in flip_list:
-            for i in range(len(base_currents)):
-                current = -base_currents[i] if flip else base_currents[i]
-                currents.append(current)
-    return jnp.array(currents)
\ No newline at end of file
+def apply_symmetries_to_currents(base_currents, nfp, stellsym):
+    flip_list = jnp.array([1., -1.]) if stellsym else jnp.array([1.])
+    flips = jnp.tile(flip_list, nfp)
+    return jnp.tile(base_currents, flips.shape[0]) * jnp.repeat(flips, base_currents.shape[0])
\ No newline at end of file
@@ -1,16 +1,17 @@
 import jax
-from torch import isin
 
 from essos.surfaces import SurfaceRZFourier
 jax.config.update("jax_enable_x64", True)
 import jax.numpy as jnp
-from jax.lax import fori_loop
 from jax import tree_util, jit, vmap
 from functools import partial
 from .plot import fix_matplotlib_3d
+from .coils import _compute_curves_geometry
 
-def compute_curvature(gammadash, gammadashdash):
-    return jnp.linalg.norm(jnp.cross(gammadash, gammadashdash, axis=1), axis=1) / jnp.linalg.norm(gammadash, axis=1)**3
+@partial(jit, static_argnames=['nfp', 'stellsym', 'n_segments'])
+def _compute_gamma(dofs, nfp, stellsym, n_segments):
+    curves = apply_symmetries_to_curves(dofs, nfp, stellsym)
+    return (curves,) + _compute_curves_geometry(curves, dofs.shape[2]//2, n_segments)
 
 class CurvesCWS:
     """
@@ -49,9 +50,8 @@ class CurvesCWS:
         self._nfp = nfp
         self._stellsym = stellsym
         self._order = dofs.shape[2]//2
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
         self.quadpoints = jnp.linspace(0, 1, self.n_segments, endpoint=False)
-        self._set_gamma()
+        self._rebuild()
 
     def __str__(self):
         return f"nfp stellsym order\n{self.nfp} {self.stellsym} {self.order}\n"\
@@ -70,23 +70,11 @@ class CurvesCWS:
     def _tree_unflatten(cls, aux_data, children):
         return cls(*children, **aux_data)
     
-    partial(jit, static_argnames=['self'])
-    def _set_gamma(self):
-        def fori_createdata(order_index: int, data: jnp.ndarray) -> jnp.ndarray:
-            return data[0] + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index - 1],                             jnp.sin(2 * jnp.pi * order_index * self.quadpoints)) + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index],                             jnp.cos(2 * jnp.pi * order_index * self.quadpoints)), \
-                   data[1] + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index - 1],  2*jnp.pi   *order_index   *jnp.cos(2 * jnp.pi * order_index * self.quadpoints)) + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index], -2*jnp.pi   *order_index   *jnp.sin(2 * jnp.pi * order_index * self.quadpoints)), \
-                   data[2] + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index - 1], -4*jnp.pi**2*order_index**2*jnp.sin(2 * jnp.pi * order_index * self.quadpoints)) + jnp.einsum("ij,k->ikj", self._curves[:, :, 2 * order_index], -4*jnp.pi**2*order_index**2*jnp.cos(2 * jnp.pi * order_index * self.quadpoints))
-        gamma          = jnp.einsum("ij,k->ikj", self._curves[:, :, 0], jnp.ones(self.n_segments))
-        gamma_dash     = jnp.zeros((jnp.size(self._curves, 0), self.n_segments, 3))
-        gamma_dashdash = jnp.zeros((jnp.size(self._curves, 0), self.n_segments, 3))
-        gamma, gamma_dash, gamma_dashdash = fori_loop(1, self._order+1, fori_createdata, (gamma, gamma_dash, gamma_dashdash)) 
-        length = jnp.array([jnp.mean(jnp.linalg.norm(d1gamma, axis=1)) for d1gamma in gamma_dash])
-        curvature = vmap(compute_curvature)(gamma_dash, gamma_dashdash)
-        self._gamma = gamma
-        self._gamma_dash = gamma_dash
-        self._gamma_dashdash = gamma_dashdash
-        self._curvature = curvature
-        self._length = length
+    def _rebuild(self):
+        (self._curves, self._gamma, self._gamma_dash, self._gamma_dashdash,
+            self._length, self._curvature) = _compute_gamma(self.dofs, self.nfp, self.stellsym, self.n_segments)
+        # Results staged into an enclosing jit trace from concrete dofs are not kept, so tracers cannot outlive it
+        self._dirty = isinstance(self._gamma, jax.core.Tracer) and not isinstance(self._dofs, jax.core.Tracer)
     
     @property
     def dofs(self):
@@ -100,11 +88,12 @@ class CurvesCWS:
         assert jnp.size(new_dofs, 2) % 2 == 1
         self._dofs = new_dofs
         self._order = jnp.size(new_dofs, 2)//2
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def curves(self):
+        if self._dirty:
+            self._rebuild()
         return self._curves
     
     @property 
@@ -117,8 +106,7 @@ class CurvesCWS:
         assert new_order > 0
         self._dofs = jnp.pad(self.dofs, ((0, 0), (0, 0), (0, 2*(new_order-self._order)))) if new_order > self._order else self.dofs[:, :, :2*(new_order)+1]
         self._order = new_order
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
 
     @property
     def n_segments(self):
@@ -130,7 +118,7 @@ class CurvesCWS:
         assert new_n_segments > 2
         self._n_segments = new_n_segments
         self.quadpoints = jnp.linspace(0, 1, self._n_segments, endpoint=False)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def nfp(self):
@@ -141,8 +129,7 @@ class CurvesCWS:
         assert isinstance(new_nfp, int)
         assert new_nfp > 0
         self._nfp = new_nfp
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def stellsym(self):
@@ -152,27 +139,36 @@ class CurvesCWS:
     def stellsym(self, new_stellsym):
         assert isinstance(new_stellsym, bool)
         self._stellsym = new_stellsym
-        self._curves = apply_symmetries_to_curves(self.dofs, self.nfp, self.stellsym)
-        self._set_gamma()
+        self._dirty = True
     
     @property
     def gamma(self):
+        if self._dirty:
+            self._rebuild()
         return self._gamma
     
     @property
     def gamma_dash(self):
+        if self._dirty:
+            self._rebuild()
         return self._gamma_dash
     
     @property
     def gamma_dashdash(self):
+        if self._dirty:
+            self._rebuild()
         return self._gamma_dashdash
     
     @property
     def length(self):
+        if self._dirty:
+            self._rebuild()
         return self._length
     
     @property
     def curvature(self):
+        if self._dirty:
+            self._rebuild()
         return self._curvature
     
     def __len__(self):
@@ -297,15 +293,6 @@ class CurvesCWS:
 
 @partial(jit, static_argnames=['nfp', 'stellsym'])
 def apply_symmetries_to_curves(base_curves, nfp, stellsym):
-    flip_list = [False, True] if stellsym else [False]
-    curves = []
-    for k in range(0, nfp):
-        for flip in flip_list:
-            for i in range(len(base_curves)):
-                if k == 0 and not flip:
-                    curves.append(base_curves[i])
-                else:
-                    raise ValueError("The curves are not symmetric")
-                    rotcurve = RotatedCurve(base_curves[i].T, 2*jnp.pi*k/nfp, flip)
-                    curves.append(rotcurve.T)
-    return jnp.array(curves)
\ No newline at end of file
+    if nfp != 1 or stellsym:
+        raise ValueError("The curves are not symmetric")
+    return base_curves
\ No newline at end of file
@@ -1,6 +1,7 @@
 import jax
 jax.config.update("jax_enable_x64", True)
 import jax.numpy as jnp
+import numpy as np
 import matplotlib.pyplot as plt
 from jax.sharding import Mesh, PartitionSpec, NamedSharding
 from jax import jit, vmap, tree_util, random, lax, device_put
@@ -30,15 +31,12 @@ def gc_to_fullorbit(field, initial_xyz, initial_vparallel, total_speed, mass, ch
         Bs = field.B_contravariant(xyz)
         AbsBs = jnp.linalg.norm(Bs)
         eB = Bs / AbsBs
-        p1 = eB
-        p2 = jnp.array([0, 0, 1])
-        p3 = -jnp.cross(p1, p2)
-        p3 /= jnp.linalg.norm(p3)
-        q1 = p1
-        q2 = p2 - jnp.dot(q1, p2) * q1
-        q2 /= jnp.linalg.norm(q2)
-        q3 = p3 - jnp.dot(q1, p3) * q1 - jnp.dot(q2, p3) * q2
+        q1 = eB
+        # Orthonormal frame around eB seeded by the z axis (x axis if eB is along z)
+        seed = jnp.where(jnp.abs(eB[2]) < 1, jnp.array([0., 0., 1.]), jnp.array([1., 0., 0.]))
+        q3 = jnp.cross(seed, q1)
         q3 /= jnp.linalg.norm(q3)
+        q2 = jnp.cross(q1, q3)
         speed_perp = jnp.sqrt(total_speed**2 - vpar**2)
         rg = mass * speed_perp / (jnp.abs(charge) * AbsBs)
         xyz_full = xyz + rg * (jnp.sin(phase_angle_full_orbit) * q2 + jnp.cos(phase_angle_full_orbit) * q3)
@@ -61,15 +59,13 @@ class Particles():
         self.initial_vxvyvz = initial_vxvyvz
         self.phase_angle_full_orbit = 0
         self.particle_index=jnp.arange(self.nparticles)
-        
-        key=jax.random.key(42)
-        self.random_keys=jax.random.split(key,self.nparticles)
-        
+        self._random_keys = None
         
         if initial_vparallel_over_v is not None:
             self.initial_vparallel_over_v = jnp.array(initial_vparallel_over_v)
         else:
-            self.initial_vparallel_over_v = random.uniform(random.PRNGKey(42), (self.nparticles,), minval=min_vparallel_over_v, maxval=max_vparallel_over_v)
+            # Drawn on the host; with random_keys split on first use, constructing Particles compiles no JAX random kernel
+            self.initial_vparallel_over_v = jnp.asarray(np.random.default_rng(42).uniform(min_vparallel_over_v, max_vparallel_over_v, size=self.nparticles))
         
         self.total_speed = jnp.sqrt(2*self.energy/self.mass)
         
@@ -79,6 +75,15 @@ class Particles():
         if field is not None and initial_xyz_fullorbit is None:
             self.to_full_orbit(field)
         
+    @property
+    def random_keys(self):
+        # Only the collision models draw Brownian paths, so the per-particle keys are split on first use.
+        # The split runs eagerly even when first read inside a jit trace, so the cached keys stay concrete
+        if self._random_keys is None:
+            with jax.ensure_compile_time_eval():
+                self._random_keys = jax.random.split(jax.random.key(42), self.nparticles)
+        return self._random_keys
+
     def to_full_orbit(self, field):
         self.initial_xyz_fullorbit, self.initial_vxvyvz = gc_to_fullorbit(field=field, initial_xyz=self.initial_xyz, initial_vparallel=self.initial_vparallel,
                                                                             total_speed=self.total_speed, mass=self.mass, charge=self.charge,
@@ -144,10 +149,7 @@ def GuidingCenterCollisionsDriftMu(t,
     m = particles.mass
     #E = m/2*v**2
     points = jnp.array([x, y, z])
-    B_covariant = field.B_covariant(points)
-    B_contravariant = field.B_contravariant(points)
-    AbsB =field.AbsB(points)
-    gradB = field.dAbsB_by_dX(points)
+    B_covariant, B_contravariant, AbsB, gradB = field.bundle(points)
     AbsB_par=AbsB #should take into account B_par modification, but it does not matter for vacuum fields, so let's keep this for now
     omega_mod = q*AbsB_par/m    
     v=jnp.sqrt(2./m*(0.5*m*vpar**2+mu*AbsB))
@@ -166,7 +168,7 @@ def GuidingCenterCollisionsDriftMu(t,
     dxdt = tag_gc*(vpar*B_contravariant/AbsB + (vpar**2/omega_mod+mu/q)*jnp.cross(B_covariant, gradB)/AbsB/AbsB)
     dvpardt=  Avpar-mu/m*jnp.dot(B_contravariant,gradB)/AbsB*tag_gc
     dmudt = Amu
-    return jnp.append(dxdt,jnp.append(dvpardt,dmudt))
+    return jnp.concatenate([dxdt, jnp.array([dvpardt, dmudt])])
 
 
 @partial(jit, static_argnums=(2))
@@ -217,10 +219,7 @@ def GuidingCenterCollisionsDrift(t,
     # condition = (jnp.sqrt(x**2 + y**2) > 10) | (jnp.abs(z) > 10)
     # def dxdt_dvdt(_):
     points = jnp.array([x, y, z])
-    B_covariant = field.B_covariant(points)
-    B_contravariant = field.B_contravariant(points)
-    AbsB = field.AbsB(points)
-    gradB = field.dAbsB_by_dX(points)
+    B_covariant, B_contravariant, AbsB, gradB = field.bundle(points)
     mu = (m*v**2/2 - m*vpar**2/2)/AbsB
     omega = q*AbsB/m
     p=m*v
@@ -235,7 +234,7 @@ def GuidingCenterCollisionsDrift(t,
     dxdt = tag_gc*(vpar*B_contravariant/AbsB + (vpar**2/omega+mu/q)*jnp.cross(B_covariant, gradB)/AbsB/AbsB)
     dvdt=(-nu_s*p+2.*Diffusion_par/p+d_Diffusion_par_dp*0.5)/m  #equation format was in p=m*v so we divide by m)
     dxidt =-xi*2.*Diffusion_perp/p**2*0.5-mu/m*jnp.dot(B_contravariant,gradB)/AbsB/v*tag_gc
-    return jnp.append(dxdt,jnp.append(dvdt,dxidt))
+    return jnp.concatenate([dxdt, jnp.array([dvdt, dxidt])])
 
 
 
@@ -252,15 +251,12 @@ def GuidingCenter(t,
     # condition = (jnp.sqrt(x**2 + y**2) > 10) | (jnp.abs(z) > 10)
     # def dxdt_dvdt(_):
     points = jnp.array([x, y, z])
-    B_covariant = field.B_covariant(points)
-    B_contravariant = field.B_contravariant(points)
-    AbsB = field.AbsB(points)
-    gradB = field.dAbsB_by_dX(points)
+    B_covariant, B_contravariant, AbsB, gradB = field.bundle(points)
     mu = (E - m*vpar**2/2)/AbsB
     omega = q*AbsB/m
     dxdt = vpar*B_contravariant/AbsB + (vpar**2/omega+mu/q)*jnp.cross(B_covariant, gradB)/AbsB/AbsB
     dvdt = -mu/m*jnp.dot(B_contravariant,gradB)/AbsB
-    return jnp.append(dxdt,dvdt)
+    return jnp.concatenate([dxdt, jnp.array([dvdt])])
     # def zero_derivatives(_):
     #     return jnp.zeros(4, dtype=float)
     # return lax.cond(condition, zero_derivatives, dxdt_dvdt, operand=None)
@@ -313,7 +309,7 @@ def LorentzCollisionsDrift(t,
     nu_s=jnp.sum(jax.vmap(nu_s_ab,in_axes=(None,None,0,None,None,None))(m, q,indeces_species,v, points,species),axis=0)
     dxdt = jnp.array([vx, vy, vz])
     dvdt =  q / m * jnp.cross(dxdt, B_contravariant)-nu_s*dxdt#*0.00000
-    return jnp.append(dxdt, dvdt)
+    return jnp.concatenate([dxdt, dvdt])
     # def zero_derivatives(_):
     #     return jnp.zeros(6, dtype=float)
     # return lax.cond(condition, zero_derivatives, dxdt_dvdt, operand=None)
@@ -336,7 +332,7 @@ def Lorentz(t,
     B_contravariant = field.B_contravariant(points)
     dxdt = jnp.array([vx, vy, vz])
     dvdt = q / m * jnp.cross(dxdt, B_contravariant)
-    return jnp.append(dxdt, dvdt)
+    return jnp.concatenate([dxdt, dvdt])
     # def zero_derivatives(_):
     #     return jnp.zeros(6, dtype=float)
     # return lax.cond(condition, zero_derivatives, dxdt_dvdt, operand=None)
@@ -356,6 +352,123 @@ def FieldLine(t,
     #     return jnp.zeros(3, dtype=float)
     # return lax.cond(condition, zero_derivatives, compute_derivatives, operand=None)
 
+@partial(jit, static_argnums=(0, 4))
+def Boris(field,
+          initial_conditions,
+          dt,
+          charge_over_mass,
+          nsteps) -> jnp.ndarray:
+    # One scan for all particles with a single batched field call per step. Compiled once per
+    # (field, nsteps) and input shapes, so Tracing instances sharing a field reuse the kernel.
+    # The carry is stored component-major, (3, nparticles), so each component is contiguous across particles
+    def update_state(state, _):
+        X, V = state
+        T = (charge_over_mass * 0.5 * dt * vmap(field.B_contravariant, in_axes=1, out_axes=1)(X)).astype(X.dtype)
+        S = 2. * T / (1. + jnp.sum(T*T, axis=0))
+        Vprime = V + jnp.cross(V, T, axis=0)
+        V = V + jnp.cross(Vprime, S, axis=0)
+        X = X + V * dt
+        return (X, V), (X, V)
+    _, (Xs, Vs) = lax.scan(update_state, (initial_conditions[:, :3].T, initial_conditions[:, 3:].T), None, length=nsteps)
+    trajectories = jnp.transpose(jnp.concatenate([Xs, Vs], axis=1), (2, 0, 1))
+    return jnp.concatenate([initial_conditions[:, None, :], trajectories], axis=1)
+
+def _no_condition(t, y, args, **kwargs):
+    return False
+
+@partial(jit, static_argnums=(0, 1, 2, 3, 4, 5, 6, 7, 8, 9))
+def _trace_impl(model,
+                field,
+                particles,
+                tol_step_size,
+                condition,
+                batched_solve,
+                fixed_step,
+                substeps,
+                requires_grad,
+                record_AbsB,
+                initial_conditions,
+                times):
+    # Solves the GuidingCenter, FullOrbit and FieldLine models. Only the initial conditions and times are traced,
+    # so Tracing instances sharing a field, particles and solver options reuse the compiled kernel.
+    # Returns the trajectories, AbsB at the save times with record_AbsB and, with fixed_step, the largest
+    # local error estimate of each particle relative to tol_step_size (None otherwise)
+    import warnings
+    warnings.simplefilter("ignore", category=FutureWarning) # see https://github.com/patrick-kidger/diffrax/issues/445 for explanation
+    vector_field = {'GuidingCenter': GuidingCenter, 'FullOrbit': Lorentz, 'FieldLine': FieldLine}[model]
+    args = field if model == 'FieldLine' else (field, particles)
+    if initial_conditions.dtype != jnp.float64:
+        # Reduced precision: the right-hand side is cast back to the dtype of the state
+        ODE_term = ODETerm(lambda t, y, args: vector_field(t, y, args).astype(y.dtype))
+    else:
+        ODE_term = ODETerm(vector_field)
+    if record_AbsB:
+        # Record AbsB at the save times while solving, so the energy diagnostic needs no second field pass
+        save_fn = lambda t, y, args: (y, jnp.asarray(field.AbsB(y[:3])))
+    else:
+        save_fn = lambda t, y, args: (y, None)
+    # Without gradients, skip the checkpointing that reverse-mode differentiation of the solve would need
+    adjoint = diffrax.RecursiveCheckpointAdjoint() if requires_grad else diffrax.ForwardMode()
+    t1 = times[-1]
+    dt0 = times[-1] / len(times)
+    stepsize_controller = PIDController(pcoeff=0.4, icoeff=0.3, dcoeff=0, rtol=tol_step_size, atol=tol_step_size)
+
+    if batched_solve:
+        # One solve for all particles, sharing a single step size controller
+        batched_ODE_term = ODETerm(lambda t, y, args: vmap(lambda y_particle: ODE_term.vector_field(t, y_particle, args))(y))
+        def compute_trajectories(initial_conditions):
+            trajectories = diffeqsolve(
+                batched_ODE_term,
+                t0=0.0,
+                t1=t1,
+                dt0=dt0,
+                y0=initial_conditions,
+                solver=diffrax.Tsit5(),
+                args=args,
+                saveat=SaveAt(ts=times, fn=lambda t, y, args: vmap(lambda y_particle: save_fn(t, y_particle, args))(y)),
+                throw=False,
+                adjoint=adjoint,
+                stepsize_controller=stepsize_controller,
+                max_steps=10000000000,
+                event = Event(condition)
+            ).ys
+            return tree_util.tree_map(lambda ys: jnp.swapaxes(ys, 0, 1), trajectories)
+        return jit(compute_trajectories, in_shardings=sharding, out_shardings=sharding)(device_put(initial_conditions, sharding)) + (None,)
+
+    def compute_trajectory(initial_condition):
+        if fixed_step:
+            # substeps Tsit5 steps between consecutive save times, without step size control
+            solver = diffrax.Tsit5()
+            dt = (times[1] - times[0]) / substeps
+            solver_state = solver.init(ODE_term, times[0], times[0] + dt, initial_condition, args)
+            def substep(state, t):
+                y, solver_state, error_ratio = state
+                y_next, y_error, _, solver_state, _ = solver.step(ODE_term, t, t + dt, y, args, solver_state, made_jump=False)
+                # Same RMS error norm the PID controller of the adaptive solve accepts steps with
+                error_ratio = jnp.maximum(error_ratio, jnp.sqrt(jnp.mean((y_error / (tol_step_size + tol_step_size * jnp.maximum(jnp.abs(y), jnp.abs(y_next))))**2)))
+                return (y_next, solver_state, error_ratio), None
+            def update_state(state, t):
+                state, _ = lax.scan(substep, state, t + dt * jnp.arange(substeps))
+                return state, state[0]
+            (_, _, error_ratio), trajectory = lax.scan(update_state, (initial_condition, solver_state, jnp.zeros((), initial_condition.dtype)), times[:-1])
+            return vmap(lambda t, y: save_fn(t, y, args))(times, jnp.vstack([initial_condition, trajectory])) + (error_ratio,)
+        return diffeqsolve(
+            ODE_term,
+            t0=0.0,
+            t1=t1,
+            dt0=dt0,
+            y0=initial_condition,
+            solver=diffrax.Tsit5(),
+            args=args,
+            saveat=SaveAt(ts=times, fn=save_fn),
+            throw=False,
+            adjoint=adjoint,
+            stepsize_controller=stepsize_controller,
+            max_steps=10000000000,
+            event = Event(condition)
+        ).ys + (None,)
+    return jit(vmap(compute_trajectory), in_shardings=sharding, out_shardings=(sharding, sharding, sharding_index))(device_put(initial_conditions, sharding))
+
 
 
 ## !!!!  Here species and tag_gc were added  (E. Neto collisions modifications)
@@ -366,7 +479,7 @@ def FieldLine(t,
 class Tracing():
     def __init__(self, trajectories_input=None, initial_conditions=None, times=None,
                  field=None, model=None, maxtime: float = 1e-7, timesteps: int = 500,
-                 tol_step_size = 1e-7, particles=None, condition=None,species=None,tag_gc=1.):
+                 tol_step_size = 1e-7, particles=None, condition=None,species=None,tag_gc=1., batched_solve=False, dtype=jnp.float64, fixed_step=False, substeps=1, chunk_size=None, requires_grad=False):
         
         if isinstance(field, Coils):
             self.field = BiotSavart(field)
@@ -382,8 +495,32 @@ class Tracing():
         self.particles = particles
         self.species=species
         self.tag_gc=tag_gc
+        self.batched_solve = batched_solve
+        self.dtype = dtype
+        self.fixed_step = fixed_step
+        self.substeps = substeps
+        self.chunk_size = chunk_size
+        if chunk_size is not None and model != 'GuidingCenterCollisionsMu':
+            raise ValueError("chunk_size only applies to the AbsB evaluation after tracing, which only the GuidingCenterCollisionsMu model performs")
+        self.requires_grad = requires_grad
+        if jnp.dtype(dtype) != jnp.float64 and model in ('GuidingCenterCollisions', 'GuidingCenterCollisionsMu', 'FullOrbitCollisions'):
+            raise ValueError("Reduced precision dtype is not available for the collision models")
+        if batched_solve:
+            if model not in ('GuidingCenter', 'FullOrbit', 'FieldLine'):
+                raise ValueError("batched_solve is only available for the GuidingCenter, FullOrbit and FieldLine models")
+            if condition is not None or isinstance(field, Vmec):
+                raise ValueError("batched_solve advances all particles together and does not support stopping conditions")
+        if fixed_step:
+            if model not in ('GuidingCenter', 'FullOrbit', 'FieldLine') or batched_solve:
+                raise ValueError("fixed_step is only available for the GuidingCenter, FullOrbit and FieldLine models without batched_solve")
+            if condition is not None or isinstance(field, Vmec):
+                raise ValueError("fixed_step does not support stopping conditions")
+            if times is not None and not jnp.allclose(jnp.diff(times), times[1] - times[0], rtol=1e-6, atol=0):
+                raise ValueError("fixed_step requires uniformly spaced times")
+        elif substeps != 1:
+            raise ValueError("substeps only applies to fixed_step")
         if condition is None:
-            self.condition = lambda t, y, args, **kwargs: False
+            self.condition = _no_condition
             if isinstance(field, Vmec):
                 if model == 'GuidingCenterCollisionsMu':
                     def condition_Vmec(t, y, args, **kwargs):
@@ -447,54 +584,52 @@ class Tracing():
         else:
             self.maxtime = jnp.max(self.times)
             self.timesteps = len(self.times)
-            
-        self._trajectories = self.trace()
         
-        if self.particles is not None:
-            self.energy = jnp.zeros((self.particles.nparticles, self.timesteps))
+        if jnp.dtype(dtype) != jnp.float64:
+            # Trace in reduced precision: state, times and RHS share dtype, tolerances are kept above its resolution
+            self.initial_conditions = jnp.asarray(self.initial_conditions, dtype=dtype)
+            self.times = jnp.asarray(self.times, dtype=dtype)
+            self.tol_step_size = max(self.tol_step_size, 10*float(jnp.finfo(dtype).eps))
             
+        self._trajectories, AbsB = self._trace_with_AbsB()
+        
         if model == 'GuidingCenter':
             @jit
-            def compute_energy_gc(trajectory):
-                xyz = trajectory[:, :3]
-                vpar = trajectory[:, 3]
-                AbsB = vmap(self.field.AbsB)(xyz)
-                mu = (self.particles.energy - self.particles.mass * vpar[0]**2 / 2) / AbsB[0]
+            def compute_energy_gc(trajectories, AbsB):
+                if AbsB is None:
+                    AbsB = self._AbsB_along_trajectories(trajectories)
+                vpar = trajectories[:, :, 3]
+                mu = (self.particles.energy - self.particles.mass * vpar[:, 0:1]**2 / 2) / AbsB[:, 0:1]
                 return self.particles.mass * vpar**2 / 2 + mu * AbsB
-            self.energy = vmap(compute_energy_gc)(self._trajectories)
+            self.energy = compute_energy_gc(self._trajectories, AbsB)
         elif model == 'GuidingCenterCollisions':
             @jit
-            def compute_energy_gc(trajectory):
-                return 0.5*self.particles.mass* trajectory[:, 3]**2
-            self.energy = vmap(compute_energy_gc)(self._trajectories)
+            def compute_energy_gc(trajectories):
+                return 0.5*self.particles.mass* trajectories[:, :, 3]**2
+            self.energy = compute_energy_gc(self._trajectories)
         elif model == 'GuidingCenterCollisionsMu':
             @jit
-            def compute_energy_gc(trajectory):
-                xyz = trajectory[:, :3]                
-                vpar = trajectory[:, 3]
-                mu = trajectory[:, 4]
-                AbsB = vmap(self.field.AbsB)(xyz)
-                return self.particles.mass * vpar**2 / 2 + mu*AbsB
-            self.energy = vmap(compute_energy_gc)(self._trajectories)
-            @jit
-            def compute_vperp_gc(trajectory):
-                xyz = trajectory[:, :3]                
-                mu = trajectory[:, 4]
-                AbsB = vmap(self.field.AbsB)(xyz)
-                return jnp.sqrt(2.*mu*AbsB/self.particles.mass)
-            self.vperp_final = vmap(compute_vperp_gc)(self._trajectories)     
+            def compute_energy_vperp_gc(trajectories):
+                AbsB = self._AbsB_along_trajectories(trajectories)
+                vpar = trajectories[:, :, 3]
+                mu = trajectories[:, :, 4]
+                energy = self.particles.mass * vpar**2 / 2 + mu*AbsB
+                vperp = jnp.sqrt(2.*mu*AbsB/self.particles.mass)
+                return energy, vperp
+            self.energy, self.vperp_final = compute_energy_vperp_gc(self._trajectories)
         elif model == 'FullOrbit' or model == 'FullOrbit_Boris' or model == 'FullOrbitCollisions':
             @jit
-            def compute_energy_fo(trajectory):
-                vxvyvz = trajectory[:, 3:]
-                return self.particles.mass / 2 * (vxvyvz[:, 0]**2 + vxvyvz[:, 1]**2 + vxvyvz[:, 2]**2)
-            self.energy = vmap(compute_energy_fo)(self._trajectories)
+            def compute_energy_fo(trajectories):
+                vxvyvz = trajectories[:, :, 3:]
+                return self.particles.mass / 2 * jnp.einsum('ptj,ptj->pt', vxvyvz, vxvyvz)
+            self.energy = compute_energy_fo(self._trajectories)
         elif model == 'FieldLine':
             self.energy = jnp.ones((len(initial_conditions), self.timesteps))
-        
-
+        elif self.particles is not None:
+            self.energy = jnp.zeros((self.particles.nparticles, self.timesteps))
 
-        self.trajectories_xyz = vmap(lambda xyz: vmap(lambda point: self.field.to_xyz(point[:3]))(xyz))(self.trajectories)
+        points = jnp.reshape(self.trajectories[:, :, :3], (-1, 3))
+        self.trajectories_xyz = jnp.reshape(vmap(self.field.to_xyz)(points), self.trajectories.shape[:2] + (3,))
         
         if isinstance(field, Vmec):
             self.loss_fractions, self.total_particles_lost, self.lost_times = self.loss_fraction()
@@ -503,33 +638,36 @@ class Tracing():
             self.total_particles_lost = None
             self.loss_times = None
 
-    @partial(jit, static_argnums=(0))
     def trace(self):
+        return self._trace_with_AbsB(record_AbsB=False)[0]
+
+    def _trace_with_AbsB(self, record_AbsB=True):
+        # Returns the trajectories and, for forward-only GuidingCenter solves, AbsB recorded at the save times (None otherwise).
+        # Differentiated solves skip the recording, so an unused energy diagnostic can be dropped from the compiled loss
+        if self.model == 'FullOrbit_Boris':
+            return Boris(self.field, device_put(self.initial_conditions, sharding), self.maxtime / self.timesteps,
+                         self.particles.charge / self.particles.mass, len(self.times)-1), None
+        if self.model in ('GuidingCenter', 'FullOrbit', 'FieldLine'):
+            trajectories, AbsB, error_ratio = _trace_impl(
+                self.model, self.field, self.particles, self.tol_step_size, self.condition, self.batched_solve, self.fixed_step,
+                self.substeps, self.requires_grad, record_AbsB and self.model == 'GuidingCenter' and not self.requires_grad,
+                self.initial_conditions, self.times)
+            if error_ratio is not None and not jnp.all(error_ratio <= 1):
+                # Without step size control nothing bounds the error; beyond the stability limit of Tsit5 the states diverge
+                import warnings
+                warnings.warn("fixed_step took steps whose local error estimate exceeds tol_step_size; increase timesteps or substeps", RuntimeWarning)
+            return trajectories, AbsB
+        return self._trace(), None
+
+    @partial(jit, static_argnums=(0))
+    def _trace(self):
+        # Collision models: each particle draws its Brownian path from its own key
+        adjoint = diffrax.RecursiveCheckpointAdjoint() if self.requires_grad else diffrax.ForwardMode()
+
         @jit
         def compute_trajectory(initial_condition, particle_key) -> jnp.ndarray:
             # initial_condition = initial_condition[0]
-            if self.model == 'FullOrbit_Boris':
-                dt=self.maxtime / self.timesteps
-                def update_state(state, _):
-                    # def update_fn(state):
-                    x = state[:3]
-                    v = state[3:]
-                    t = self.particles.charge / self.particles.mass *  self.field.B_contravariant(x) * 0.5 * dt
-                    s = 2. * t / (1. + jnp.dot(t,t))
-                    vprime = v + jnp.cross(v, t)
-                    v += jnp.cross(vprime, s)
-                    x += v * dt
-                    new_state = jnp.concatenate((x, v))
-                    return new_state, new_state
-                    # def no_update_fn(state):
-                    #     x, v = state
-                    #     return (x, v), jnp.concatenate((x, v))
-                    # condition = (jnp.sqrt(x1**2 + x2**2) > 50) | (jnp.abs(x3) > 20)
-                    # return lax.cond(condition, no_update_fn, update_fn, state)
-                    # return update_fn(state)
-                _, trajectory = lax.scan(update_state, initial_condition, jnp.arange(len(self.times)-1))
-                trajectory = jnp.vstack([initial_condition, trajectory])
-            elif self.model == 'GuidingCenterCollisions':
+            if self.model == 'GuidingCenterCollisions':
                 import warnings
                 warnings.simplefilter("ignore", category=FutureWarning) # see https://github.com/patrick-kidger/diffrax/issues/445 for explanation
                 t0=0.0
@@ -552,7 +690,7 @@ class Tracing():
                     args=self.args,
                     saveat=SaveAt(ts=self.times),
                     throw=False,
-                    # adjoint=DirectAdjoint(),
+                    adjoint=adjoint,
                     #stepsize_controller = PIDController(pcoeff=0.4, icoeff=0.3, dcoeff=0, rtol=self.tol_step_size, atol=self.tol_step_size),
                     max_steps=10000000000,
                     event = Event(self.condition)
@@ -580,7 +718,7 @@ class Tracing():
                     args=self.args,
                     saveat=SaveAt(ts=self.times),
                     throw=False,
-                    # adjoint=DirectAdjoint(),
+                    adjoint=adjoint,
                     #stepsize_controller = PIDController(pcoeff=0.4, icoeff=0.3, dcoeff=0, rtol=self.tol_step_size, atol=self.tol_step_size,dtmin=dt0),
                     max_steps=10000000000,
                     event = Event(self.condition)
@@ -608,38 +746,29 @@ class Tracing():
                     args=self.args,
                     saveat=SaveAt(ts=self.times),
                     throw=False,
-                    # adjoint=DirectAdjoint(),
+                    adjoint=adjoint,
                     #stepsize_controller = PIDController(pcoeff=0.4, icoeff=0.3, dcoeff=0, rtol=self.tol_step_size, atol=self.tol_step_size,dtmin=dt0),
                     max_steps=10000000000,
                     event = Event(self.condition)
                 ).ys                            
-            else:
-                import warnings
-                warnings.simplefilter("ignore", category=FutureWarning) # see https://github.com/patrick-kidger/diffrax/issues/445 for explanation
-                trajectory = diffeqsolve(
-                    self.ODE_term,
-                    t0=0.0,
-                    t1=self.maxtime,
-                    dt0=self.maxtime / self.timesteps,
-                    y0=initial_condition,
-                    solver=diffrax.Tsit5(),
-                    args=self.args,
-                    saveat=SaveAt(ts=self.times),
-                    throw=False,
-                    # adjoint=DirectAdjoint(),
-                    stepsize_controller = PIDController(pcoeff=0.4, icoeff=0.3, dcoeff=0, rtol=self.tol_step_size, atol=self.tol_step_size),
-                    max_steps=10000000000,
-                    event = Event(self.condition)
-                ).ys
             return trajectory
         
         return jit(vmap(compute_trajectory,in_axes=(0,0)), in_shardings=(sharding,sharding_index), out_shardings=sharding)(
-            device_put(self.initial_conditions, sharding), device_put(self.particles.random_keys if self.particles else None, sharding_index))
+            device_put(self.initial_conditions, sharding), device_put(self.particles.random_keys, sharding_index))
         #x=jax.device_put(self.initial_conditions, sharding)
         #y=jax.device_put(self.particles.random_keys, sharding_index)        
         #sharded_fun = jax.jit(jax.shard_map(jax.vmap(compute_trajectory,in_axes=(0,0)), mesh=mesh, in_specs=(spec,spec_index), out_specs=spec))
         #return sharded_fun(x, y).block_until_ready()    
 
+    def _AbsB_along_trajectories(self, trajectories):
+        # With chunk_size, the field is evaluated sequentially over chunks of points to bound the memory of its intermediates
+        xyz = jnp.reshape(trajectories[:, :, :3], (-1, 3))
+        if self.chunk_size is None:
+            AbsB = vmap(self.field.AbsB)(xyz)
+        else:
+            AbsB = lax.map(self.field.AbsB, xyz, batch_size=self.chunk_size)
+        return jnp.reshape(AbsB, trajectories.shape[:2])
+
     @property
     def trajectories(self):
         return self._trajectories
@@ -662,21 +791,29 @@ class Tracing():
         except ImportError: raise ImportError("The 'numpy' library is required. Please install it using 'pip install numpy'.")
         try: from pyevtk.hl import polyLinesToVTK
         except ImportError: raise ImportError("The 'pyevtk' library is required. Please install it using 'pip install pyevtk'.")
-        x = np.concatenate([xyz[:, 0] for xyz in self.trajectories_xyz])
-        y = np.concatenate([xyz[:, 1] for xyz in self.trajectories_xyz])
-        z = np.concatenate([xyz[:, 2] for xyz in self.trajectories_xyz])
-        ppl = np.asarray([xyz.shape[0] for xyz in self.trajectories_xyz])
-        data = np.array(jnp.concatenate([i*jnp.ones((self.trajectories[i].shape[0], )) for i in range(len(self.trajectories))]))
+        trajectories_xyz = np.asarray(self.trajectories_xyz)
+        nparticles, timesteps = trajectories_xyz.shape[:2]
+        x = np.ascontiguousarray(trajectories_xyz[:, :, 0].ravel())
+        y = np.ascontiguousarray(trajectories_xyz[:, :, 1].ravel())
+        z = np.ascontiguousarray(trajectories_xyz[:, :, 2].ravel())
+        ppl = np.full(nparticles, timesteps)
+        data = np.repeat(np.arange(nparticles, dtype=float), timesteps)
         polyLinesToVTK(filename, x, y, z, pointsPerLine=ppl, pointData={'idx': data})
     
     def plot(self, ax=None, show=True, axis_equal=True, n_trajectories_plot=5, **kwargs):
         if ax is None or ax.name != "3d":
             fig = plt.figure()
             ax = fig.add_subplot(projection='3d')
-        trajectories_xyz = jnp.array(self.trajectories_xyz)
-        n_trajectories_plot = jnp.min(jnp.array([n_trajectories_plot, trajectories_xyz.shape[0]]))
-        for i in random.choice(random.PRNGKey(0), trajectories_xyz.shape[0], (n_trajectories_plot,), replace=False):
-            ax.plot(trajectories_xyz[i, :, 0], trajectories_xyz[i, :, 1], trajectories_xyz[i, :, 2], linewidth=0.5, **kwargs)
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection
+        trajectories_xyz = np.asarray(self.trajectories_xyz)
+        n_trajectories_plot = min(n_trajectories_plot, trajectories_xyz.shape[0])
+        lines = trajectories_xyz[np.asarray(random.choice(random.PRNGKey(0), trajectories_xyz.shape[0], (n_trajectories_plot,), replace=False))]
+        # All trajectories are drawn as one collection, coloured from the axes' own property cycle so that it
+        # advances as separate ax.plot calls would, also across repeated plots on the same axes
+        if 'color' not in kwargs and 'colors' not in kwargs:
+            kwargs['colors'] = [ax._get_lines.get_next_color() for _ in range(n_trajectories_plot)]
+        ax.auto_scale_xyz(lines[:, :, 0], lines[:, :, 1], lines[:, :, 2], had_data=ax.has_data())
+        ax.add_collection3d(Line3DCollection(lines, linewidth=0.5, **kwargs))
         ax.grid(False)
         if axis_equal:
             fix_matplotlib_3d(ax)
@@ -2,24 +2,34 @@ import jax
 jax.config.update("jax_enable_x64", True)
 import jax.numpy as jnp
 from functools import partial
-from jax import jit, jacfwd, grad, vmap, tree_util, lax
+from jax import jit, jacfwd, grad, value_and_grad, vmap, tree_util, lax
 from essos.surfaces import SurfaceRZFourier, BdotN_over_B
 from essos.plot import fix_matplotlib_3d
 from essos.util import newton
 
 class BiotSavart():
-    def __init__(self, coils):
+    def __init__(self, coils, precision=None):
         self.coils = coils
         self.currents = coils.currents
         self.gamma = coils.gamma
         self.gamma_dash = coils.gamma_dash
+        # Fixed for the lifetime of the field, so B is compiled for these loop bounds and weights
+        self.ncoils, self.nsegments = self.gamma.shape[:2]
+        self._segment_weights = self.currents*1e-7/self.nsegments
+        self.precision = precision # experimental, e.g. jnp.bfloat16 coil segments with float32 accumulation
     
     @partial(jit, static_argnames=['self'])
     def B(self, points):
+        if self.precision is not None:
+            points = jnp.array(points)
+            dif_R = (points.astype(self.precision)-self.gamma.astype(self.precision)).T
+            dB = jnp.cross(self.gamma_dash.astype(self.precision).T, dif_R, axisa=0, axisb=0, axisc=0)/jnp.linalg.norm(dif_R, axis=0)**3
+            dB_sum = jnp.einsum("i,bai", self._segment_weights.astype(self.precision), dB, optimize="greedy", preferred_element_type=jnp.float32)
+            return jnp.sum(dB_sum, axis=0).astype(points.dtype)
         dif_R = (jnp.array(points)-self.gamma).T
         dB = jnp.cross(self.gamma_dash.T, dif_R, axisa=0, axisb=0, axisc=0)/jnp.linalg.norm(dif_R, axis=0)**3
-        dB_sum = jnp.einsum("i,bai", self.currents*1e-7, dB, optimize="greedy")
-        return jnp.mean(dB_sum, axis=0)
+        dB_sum = jnp.einsum("i,bai", self._segment_weights, dB, optimize="greedy")
+        return jnp.sum(dB_sum, axis=0)
     
     @partial(jit, static_argnames=['self'])
     def B_covariant(self, points):
@@ -41,6 +51,15 @@ class BiotSavart():
     def dAbsB_by_dX(self, points):
         return grad(self.AbsB)(points)
     
+    @partial(jit, static_argnames=['self'])
+    def bundle(self, points):
+        def B_with_aux(points):
+            B = self.B(points)
+            return B, B
+        dB, B = jacfwd(B_with_aux, has_aux=True)(points)
+        AbsB = jnp.linalg.norm(B)
+        return B, B, AbsB, jnp.dot(B, dB) / AbsB
+    
     @partial(jit, static_argnames=['self'])
     def to_xyz(self, points):
         return points
@@ -174,6 +193,11 @@ class Vmec():
     def dAbsB_by_dX(self, points):
         return grad(self.AbsB)(points)
     
+    @partial(jit, static_argnames=['self'])
+    def bundle(self, points):
+        AbsB, gradB = value_and_grad(self.AbsB)(points)
+        return self.B_covariant(points), self.B_contravariant(points), AbsB, gradB
+    
     @partial(jit, static_argnames=['self'])
     def to_xyz(self, points):
         s, theta, phi = points
@@ -91,7 +91,7 @@ def loss_coils_and_nearaxis(x, field_nearaxis, dofs_curves, currents_scale, nfp,
 def loss_particle_drift(field, particles, maxtime=1e-5, num_steps=300, trace_tolerance=1e-5, model='GuidingCenter'):
     particles.to_full_orbit(field)
     tracing = Tracing(field=field, model=model, particles=particles, maxtime=maxtime,
-                      timesteps=num_steps, tol_step_size=trace_tolerance)
+                      timesteps=num_steps, tol_step_size=trace_tolerance, requires_grad=True)
     trajectories = tracing.trajectories
     R_axis = jnp.mean(jnp.sqrt(vmap(lambda dofs: dofs[0, 0]**2 + dofs[1, 0]**2)(field.coils.dofs_curves)))
     radial_factor = jnp.sqrt(jnp.square(trajectories[:,:,0])+jnp.square(trajectories[:,:,1]))-R_axis
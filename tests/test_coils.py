@@ -1,5 +1,6 @@
 import pytest
-from essos.coils import Curves
+from essos.coils import Curves, Coils, CreateEquallySpacedCurves, RotatedCurve, apply_symmetries_to_curves, apply_symmetries_to_currents
+import jax
 import jax.numpy as jnp
 import random
 
@@ -47,6 +48,27 @@ def test_curves_property_setters():
     curves.stellsym = False
     assert curves.stellsym == False
 
+def test_curves_chained_setters():
+    dofs = jnp.reshape(jnp.linspace(-1, 1, 2*3*5), (2, 3, 5))
+    curves = Curves(dofs)
+    curves.nfp = 3
+    curves.stellsym = False
+    curves.order = 3
+    expected = Curves(jnp.pad(dofs, ((0, 0), (0, 0), (0, 2))), nfp=3, stellsym=False)
+    assert curves.gamma.shape == (6, 100, 3)
+    assert jnp.allclose(curves.gamma, expected.gamma)
+    assert jnp.allclose(curves.length, expected.length)
+
+def test_curves_read_under_jit_stays_concrete():
+    curves = CreateEquallySpacedCurves(n_curves=2, order=2, R=1.0, r=0.3, nfp=2, stellsym=True)
+    coils = Coils(curves, jnp.ones(2))
+    jax.jit(lambda x: jnp.sum(coils.gamma)*x)(1.0)
+    assert not isinstance(coils.gamma, jax.core.Tracer)
+    coils.nfp = 3
+    jax.jit(lambda x: jnp.sum(coils.gamma)*x)(1.0)
+    assert not isinstance(coils.gamma, jax.core.Tracer)
+    assert jnp.allclose(jnp.sum(coils.gamma), jnp.sum(Coils(CreateEquallySpacedCurves(2, 2, 1.0, 0.3, nfp=3, stellsym=True), jnp.ones(2)).gamma))
+
 def test_curves_str_repr():
     dofs = jnp.zeros((2, 3, 5))
     curves = Curves(dofs)
@@ -115,5 +137,52 @@ def test_curves_iter():
     for curve in curves:
         assert curve.curves.shape == (1, 3, 5)
 
+def test_curves_fourier_series():
+    order = 3
+    dofs = jnp.reshape(jnp.linspace(-1, 1, 2*3*(2*order+1)), (2, 3, 2*order+1))
+    curves = Curves(dofs, n_segments=20, nfp=1, stellsym=False)
+    t = 2*jnp.pi*curves.quadpoints
+    gamma = jnp.zeros((2, 20, 3)) + dofs[:, None, :, 0]
+    gamma_dash = jnp.zeros((2, 20, 3))
+    for n in range(1, order+1):
+        gamma += jnp.einsum("cd,k->ckd", dofs[:, :, 2*n-1], jnp.sin(n*t)) + jnp.einsum("cd,k->ckd", dofs[:, :, 2*n], jnp.cos(n*t))
+        gamma_dash += 2*jnp.pi*n*(jnp.einsum("cd,k->ckd", dofs[:, :, 2*n-1], jnp.cos(n*t)) - jnp.einsum("cd,k->ckd", dofs[:, :, 2*n], jnp.sin(n*t)))
+    assert jnp.allclose(curves.gamma, gamma)
+    assert jnp.allclose(curves.gamma_dash, gamma_dash)
+
+def test_curves_float32_fourier_basis():
+    dofs = jnp.reshape(jnp.linspace(-1, 1, 2*3*5), (2, 3, 5))
+    curves = Curves(dofs, nfp=2)
+    curves_float32 = Curves(dofs, nfp=2, dtype=jnp.float32)
+    assert curves_float32.gamma.dtype == curves.gamma.dtype
+    assert jnp.allclose(curves_float32.gamma, curves.gamma, atol=1e-5)
+    assert jnp.allclose(curves_float32.gamma_dash, curves.gamma_dash, atol=1e-4)
+
+def test_apply_symmetries_to_curves():
+    base_curves = jnp.arange(2*3*5, dtype=float).reshape(2, 3, 5)
+    nfp = 3
+    expected = []
+    for k in range(nfp):
+        for flip in [False, True]:
+            for curve in base_curves:
+                if k == 0 and not flip:
+                    expected.append(curve)
+                else:
+                    expected.append(RotatedCurve(curve.T, 2*jnp.pi*k/nfp, flip).T)
+    curves = apply_symmetries_to_curves(base_curves, nfp, True)
+    assert curves.shape == (2*2*nfp, 3, 5)
+    assert jnp.allclose(curves, jnp.array(expected))
+
+def test_apply_symmetries_to_currents():
+    base_currents = jnp.array([1.0, 2.0])
+    nfp = 3
+    expected = []
+    for k in range(nfp):
+        for flip in [False, True]:
+            for current in base_currents:
+                expected.append(-current if flip else current)
+    assert jnp.allclose(apply_symmetries_to_currents(base_currents, nfp, True), jnp.array(expected))
+    assert jnp.allclose(apply_symmetries_to_currents(base_currents, nfp, False), jnp.tile(base_currents, nfp))
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
@@ -1,7 +1,12 @@
 import pytest
+import warnings
+import matplotlib.pyplot as plt
 import jax.numpy as jnp
-from essos.constants import ALPHA_PARTICLE_MASS, ALPHA_PARTICLE_CHARGE, FUSION_ALPHA_PARTICLE_ENERGY
-from essos.dynamics import Particles, GuidingCenter, Lorentz, FieldLine, Tracing
+from essos.constants import ALPHA_PARTICLE_MASS, ALPHA_PARTICLE_CHARGE, FUSION_ALPHA_PARTICLE_ENERGY, ELECTRON_MASS, PROTON_MASS
+from essos.background_species import BackgroundSpecies
+from essos.coils import Coils, CreateEquallySpacedCurves
+from essos.fields import BiotSavart
+from essos.dynamics import Particles, GuidingCenter, Lorentz, FieldLine, Boris, Tracing
 
 def test_particles_initialization_all_params():
     nparticles = 100
@@ -62,6 +67,9 @@ class MockField:
     
     def dAbsB_by_dX(self, points):
         return jnp.array([0.0, 0.0, 1.0])
+    
+    def bundle(self, points):
+        return self.B_covariant(points), self.B_contravariant(points), self.AbsB(points), self.dAbsB_by_dX(points)
 
     def to_xyz(self, points):
         return points
@@ -74,6 +82,23 @@ def particles():
 def field():
     return MockField()
 
+@pytest.fixture
+def tracing(field, particles):
+    return Tracing(field=field, model='GuidingCenter', particles=particles, timesteps=200)
+
+@pytest.fixture(scope="module")
+def coils_field():
+    curves = CreateEquallySpacedCurves(n_curves=3, order=1, R=1.0, r=0.4)
+    return BiotSavart(Coils(curves, jnp.array([1e7, 1e7, 1e7])))
+
+@pytest.fixture(scope="module")
+def coils_particles():
+    return Particles(jnp.array([[1.0 + 0.02*i, 0.0, 0.0] for i in range(5)]), energy=FUSION_ALPHA_PARTICLE_ENERGY/100)
+
+@pytest.fixture(scope="module")
+def coils_tracing(coils_field, coils_particles):
+    return Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, maxtime=1e-6, timesteps=100)
+
 def test_particles_initialization(particles):
     assert particles.nparticles == 10
     assert particles.charge == ALPHA_PARTICLE_CHARGE
@@ -83,6 +108,11 @@ def test_particles_initialization(particles):
     assert particles.initial_vparallel.shape == (10,)
     assert particles.initial_vperpendicular.shape == (10,)
 
+def test_particles_random_keys_split_on_first_use(particles):
+    assert particles._random_keys is None
+    assert particles.random_keys.shape == (particles.nparticles,)
+    assert particles.random_keys is particles.random_keys
+
 def test_guiding_center(field, particles):
     initial_conditions = jnp.array([1.0, 0.0, 0.0, 1])
     t = 0.0
@@ -101,6 +131,47 @@ def test_field_line(field):
     result = FieldLine(t, initial_condition, field)
     assert result.shape == (3,)
 
+def test_boris(field):
+    initial_conditions = jnp.array([[1.0, 0.0, 0.0, 1e5, 2e5, 3e5]] * 3)
+    trajectories = Boris(field, initial_conditions, 1e-9, ALPHA_PARTICLE_CHARGE/ALPHA_PARTICLE_MASS, 100)
+    assert trajectories.shape == (3, 101, 6)
+    assert jnp.allclose(trajectories[:, 0], initial_conditions)
+    speed = jnp.linalg.norm(trajectories[:, :, 3:], axis=2)
+    assert jnp.allclose(speed, speed[:, :1])
+
+class CountingField(MockField):
+    # Counts field evaluations made while JAX traces a kernel, so a reused compiled kernel leaves the counts unchanged
+    def __init__(self):
+        self.traced_calls = 0
+
+    def B_contravariant(self, points):
+        self.traced_calls += 1
+        return super().B_contravariant(points)
+
+    def bundle(self, points):
+        self.traced_calls += 1
+        return super().bundle(points)
+
+def test_tracing_boris_reuses_compiled_kernel():
+    field = CountingField()
+    particles = Particles(jnp.array([[1.0, 0.0, 0.0]] * 4), field=field)
+    tracing = Tracing(field=field, model='FullOrbit_Boris', particles=particles, timesteps=50)
+    assert tracing.trajectories.shape == (particles.nparticles, 50, 6)
+    assert jnp.allclose(tracing.trajectories, Boris(field, tracing.initial_conditions, tracing.maxtime / tracing.timesteps,
+                                                    particles.charge / particles.mass, 49))
+    traced_calls = field.traced_calls
+    Tracing(field=field, model='FullOrbit_Boris', particles=particles, timesteps=50, maxtime=2e-7)
+    assert field.traced_calls == traced_calls
+
+def test_tracing_reuses_compiled_kernel():
+    field = CountingField()
+    particles = Particles(jnp.array([[1.0, 0.0, 0.0]] * 4))
+    tracing = Tracing(field=field, model='GuidingCenter', particles=particles, timesteps=50)
+    traced_calls = field.traced_calls
+    tracing_longer = Tracing(field=field, model='GuidingCenter', particles=particles, timesteps=50, maxtime=2e-7)
+    assert field.traced_calls == traced_calls
+    assert jnp.allclose(tracing_longer.times, 2*tracing.times)
+
 def test_tracing_initialization(field, particles):
     x = jnp.linspace(1, 2, particles.nparticles)
     y = jnp.zeros(particles.nparticles)
@@ -121,5 +192,63 @@ def test_tracing_trace(field, particles):
     trajectories = tracing.trace()
     assert trajectories.shape == (particles.nparticles, 200, 4)
 
+def test_tracing_plot_advances_color_cycle(tracing):
+    ax = plt.figure().add_subplot(projection='3d')
+    tracing.plot(ax=ax, show=False, n_trajectories_plot=2)
+    tracing.plot(ax=ax, show=False, n_trajectories_plot=2)
+    colors = [tuple(color) for collection in ax.collections for color in collection.get_colors()]
+    assert len(set(colors)) == 4
+    plt.close(ax.figure)
+
+def test_tracing_batched_solve(coils_field, coils_particles, coils_tracing):
+    tracing_batched = Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, maxtime=1e-6, timesteps=100, batched_solve=True)
+    assert tracing_batched.trajectories.shape == (coils_particles.nparticles, 100, 4)
+    assert jnp.allclose(tracing_batched.trajectories, coils_tracing.trajectories, rtol=1e-5, atol=1e-6)
+
+def test_tracing_float32(coils_field, coils_particles, coils_tracing):
+    tracing_float32 = Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, maxtime=1e-6, timesteps=100, dtype=jnp.float32)
+    assert tracing_float32.trajectories.dtype == jnp.float32
+    assert jnp.allclose(tracing_float32.trajectories, coils_tracing.trajectories, rtol=1e-3, atol=1e-4)
+
+def test_tracing_fixed_step(coils_field, coils_particles, coils_tracing):
+    tracing_fixed_step = Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, maxtime=1e-6, timesteps=100, fixed_step=True)
+    assert tracing_fixed_step.trajectories.shape == (coils_particles.nparticles, 100, 4)
+    assert jnp.allclose(tracing_fixed_step.trajectories, coils_tracing.trajectories, rtol=1e-5, atol=1e-6)
+
+def test_tracing_fixed_step_substeps(coils_field, coils_particles, coils_tracing):
+    with pytest.warns(RuntimeWarning):
+        Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, maxtime=1e-6, timesteps=4, fixed_step=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        tracing_substeps = Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, maxtime=1e-6, timesteps=4, fixed_step=True, substeps=33)
+    assert jnp.allclose(tracing_substeps.trajectories, coils_tracing.trajectories[:, ::33], rtol=1e-5, atol=1e-6)
+    with pytest.raises(ValueError):
+        Tracing(field=coils_field, model='GuidingCenter', particles=coils_particles, timesteps=4, substeps=33)
+
+def test_tracing_fixed_step_rejects_nonuniform_times(field, particles):
+    times = jnp.array([0, 1e-10, 5e-10, 6e-10, 2e-9])
+    with pytest.raises(ValueError):
+        Tracing(field=field, model='GuidingCenter', particles=particles, times=times, fixed_step=True)
+
+def test_tracing_chunk_size(field, particles):
+    species = BackgroundSpecies(number_species=1, mass_array=jnp.array([ELECTRON_MASS/PROTON_MASS]), charge_array=jnp.array([-1.]),
+                                n_array=jnp.array([1e20]), T_array=jnp.array([1e3]))
+    tracing = Tracing(field=field, model='GuidingCenterCollisionsMu', particles=particles, timesteps=20, species=species)
+    tracing_chunked = Tracing(field=field, model='GuidingCenterCollisionsMu', particles=particles, timesteps=20, species=species, chunk_size=64)
+    assert tracing_chunked.energy.shape == (particles.nparticles, 20)
+    assert jnp.allclose(tracing_chunked.energy, tracing.energy)
+    assert jnp.allclose(tracing_chunked.vperp_final, tracing.vperp_final)
+    with pytest.raises(ValueError):
+        Tracing(field=field, model='GuidingCenter', particles=particles, timesteps=20, chunk_size=64)
+
+def test_tracing_recorded_AbsB_energy(coils_particles, coils_tracing):
+    trajectories, AbsB_recorded = coils_tracing._trace_with_AbsB()
+    assert coils_tracing._trace_with_AbsB(record_AbsB=False)[1] is None
+    AbsB = coils_tracing._AbsB_along_trajectories(trajectories)
+    assert jnp.allclose(AbsB_recorded, AbsB)
+    vpar = trajectories[:, :, 3]
+    mu = (coils_particles.energy - coils_particles.mass * vpar[:, 0:1]**2 / 2) / AbsB[:, 0:1]
+    assert jnp.allclose(coils_tracing.energy, coils_particles.mass * vpar**2 / 2 + mu * AbsB)
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import pytest
 from essos.fields import BiotSavart
+from essos.coils import Coils, CreateEquallySpacedCurves
 import jax.numpy as jnp
 from jax import random
 
@@ -17,6 +18,37 @@ def test_biot_savart_initialization():
     assert jnp.allclose(biot_savart.gamma, coils.gamma)
     assert jnp.allclose(biot_savart.gamma_dash, coils.gamma_dash)
 
+def test_biot_savart_bundle():
+    coils = MockCoils()
+    biot_savart = BiotSavart(coils)
+    points = jnp.array([0.5, 0.5, 0.5])
+    B_covariant, B_contravariant, AbsB, gradB = biot_savart.bundle(points)
+    assert jnp.allclose(B_covariant, biot_savart.B_covariant(points))
+    assert jnp.allclose(B_contravariant, biot_savart.B_contravariant(points))
+    assert jnp.allclose(AbsB, biot_savart.AbsB(points))
+    assert jnp.allclose(gradB, biot_savart.dAbsB_by_dX(points))
+
+def test_biot_savart_precision():
+    coils = MockCoils()
+    biot_savart = BiotSavart(coils)
+    biot_savart_float32 = BiotSavart(coils, precision=jnp.float32)
+    points = jnp.array([0.5, 0.5, 0.5])
+    B = biot_savart.B(points)
+    B_float32 = biot_savart_float32.B(points)
+    assert B_float32.dtype == B.dtype
+    assert jnp.allclose(B_float32, B, rtol=1e-3)
+
+def test_biot_savart_precision_bfloat16():
+    coils = Coils(CreateEquallySpacedCurves(n_curves=3, order=1, R=1.0, r=0.4), jnp.array([1e7, 1e7, 1e7]))
+    biot_savart = BiotSavart(coils)
+    biot_savart_bfloat16 = BiotSavart(coils, precision=jnp.bfloat16)
+    for points in jnp.array([[1.0, 0.0, 0.0], [1.1, 0.1, 0.05], [0.9, -0.2, 0.1]]):
+        B = biot_savart.B(points)
+        B_bfloat16 = biot_savart_bfloat16.B(points)
+        assert B_bfloat16.dtype == B.dtype
+        # bfloat16 keeps 8 significant bits, so the error is measured against |B| rather than per component
+        assert jnp.linalg.norm(B_bfloat16 - B) < 1e-2 * jnp.linalg.norm(B)
+
 # def test_biot_savart_B():
 #     coils = MockCoils()
 #     biot_savart = BiotSavart(coils)